@@ -0,0 +1,89 @@
+"""Per-process background threads and file polling for serving workers.
+
+Under gunicorn with preload_app, objects are created in the master and
+forked into every worker. Threads do not survive a fork, so each worker
+starts its own with PerProcessThread, and locks held by another thread at
+fork time are replaced in the child. Files published by other processes
+(model pointer, responses, profiler settings) are watched with
+FilePoller, which checks the mtime at most once per interval.
+"""
+import os
+import threading
+import time
+import weakref
+
+_instances = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    # A lock held by another thread in the parent would never be released here
+    for instance in list(_instances):
+        instance._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class PerProcessThread:
+    """A daemon thread running target, started at most once per process."""
+
+    def __init__(self, target, name, setup=None):
+        self.target = target
+        self.name = name
+        # Called before each start, e.g. to replace queues inherited from the parent
+        self.setup = setup
+        self._pid = None
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    def ensure_started(self):
+        """Start the thread if this process has none yet; cheap to call per request."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                if self.setup is not None:
+                    self.setup()
+                threading.Thread(target=self.target, name=self.name, daemon=True).start()
+                self._pid = os.getpid()
+
+
+class FilePoller:
+    """Calls on_change(mtime) when a file's mtime changes; checks at most once per interval.
+
+    One thread checks at a time and the others return at once. The mtime is
+    recorded whatever on_change returns, so a file it rejects is retried
+    only once it changes again. on_change returns True if it applied the change.
+    """
+
+    def __init__(self, path, interval, on_change):
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change
+        self.mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    def current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self):
+        if self.interval <= 0 or time.monotonic() < self._next_check:
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.interval
+            mtime = self.current_mtime()
+            if mtime is None or mtime == self.mtime:
+                return False
+            try:
+                return self.on_change(mtime)
+            finally:
+                self.mtime = mtime
+        finally:
+            self._lock.release()
@@ -0,0 +1,119 @@
+"""Server-side micro-batching for single-question /ask requests.
+
+Requests arriving within a short window (or until the batch is full) are
+answered with one Predictor.answer_questions call, so SpaCy and the
+classifier see a batch even when every client sends one question.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from background import PerProcessThread
+from metrics import BATCH_QUEUE_WAIT_SECONDS, BATCH_REJECTED, BATCH_SIZE
+
+
+class QueueFull(Exception):
+    """The batcher already holds max_queue pending questions."""
+
+
+class RollingStats:
+    """Count, sum, max and percentiles over the most recent samples, for this process's /stats."""
+
+    def __init__(self, window=2048):
+        self.window = window
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = []
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+            self._recent.append(value)
+            if len(self._recent) > self.window:
+                del self._recent[:len(self._recent) - self.window]
+
+    def info(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total, maximum = self.count, self.total, self.max
+        info = {'count': count, 'mean': total / count if count else 0.0, 'max': maximum}
+        for p in (50, 95, 99):
+            info['p%d' % p] = recent[min(len(recent) - 1, len(recent) * p // 100)] if recent else 0.0
+        return info
+
+
+class MicroBatcher:
+    def __init__(self, handler, window_ms=3.0, max_batch=32, max_queue=1024):
+        # handler takes a list of questions and returns one result per question
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.queue_wait_ms = RollingStats()
+        self.batch_size = RollingStats()
+        self.rejected = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Each process gets a fresh queue along with its batching thread
+        self._worker = PerProcessThread(self._run, 'micro-batcher', setup=self._new_queue)
+
+    def _new_queue(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+
+    def submit(self, question):
+        """Queue a question; returns a Future for its result. Raises QueueFull."""
+        self._worker.ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((question, future, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            BATCH_REJECTED.inc()
+            raise QueueFull()
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.add((started - enqueued) * 1000.0)
+                BATCH_QUEUE_WAIT_SECONDS.observe(started - enqueued)
+            self.batch_size.add(len(batch))
+            BATCH_SIZE.observe(len(batch))
+            try:
+                results = self.handler([question for question, _, _ in batch])
+            except Exception as exc:
+                for _, future, _ in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def info(self):
+        return {
+            'window_ms': self.window * 1000.0,
+            'max_batch': self.max_batch,
+            'max_queue': self.max_queue,
+            'queue_depth': self._queue.qsize(),
+            'rejected': self.rejected,
+            'queue_wait_ms': self.queue_wait_ms.info(),
+            'batch_size': self.batch_size.info(),
+        }
@@ -0,0 +1,260 @@
+"""Latency and throughput benchmarks for training and the /ask path.
+
+    python benchmark.py all [--output bench_results.json]
+    python benchmark.py cold-start | latency | throughput [options]
+
+cold-start times each startup phase (CSV load, SpaCy load, preprocessing,
+fit, index build) and a warm artifact load. latency sends sequential
+/ask requests through the Flask test client and reports p50/p95/p99.
+throughput drives /ask from several client threads at each concurrency
+level, in process or against a running server with --url. Questions come
+from a seeded generator over questions_dataset.csv and et.csv, and
+results are written as JSON so runs can be compared across commits.
+"""
+import argparse
+import importlib.metadata
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ET_PATH = os.path.join(BASE_DIR, 'et.csv')
+
+# Fillers wrapped around dataset questions to make near-verbatim variants
+PREFIXES = ['', '', 'Hi, ', 'Please tell me, ', 'Quick question: ', 'Doctor, ']
+SUFFIXES = ['', '', ' Thanks!', ' Please explain.', ' I am worried.']
+
+
+class QuestionGenerator:
+    """Deterministic stream of realistic questions seeded from the datasets.
+
+    A mix of verbatim rows (exact-match path), case/filler variants
+    (nearest-neighbour path) and rows with a word dropped (classifier path).
+    """
+
+    def __init__(self, seed=0):
+        from model_store import DATASET_PATH, load_dataset
+
+        self.random = random.Random(seed)
+        questions = list(load_dataset(DATASET_PATH)['question'])
+        # et.csv has the same kind of rows with the columns the other way round
+        et = pd.read_csv(ET_PATH, header=None, names=['category', 'question'], encoding='utf-8-sig', dtype=str)
+        questions += list(et['question'])
+        self.questions = [q.strip() for q in questions if isinstance(q, str) and q.strip()]
+
+    def __call__(self):
+        question = self.random.choice(self.questions)
+        kind = self.random.random()
+        if kind < 0.4:
+            return question
+        if kind < 0.7:
+            question = question.lower() if self.random.random() < 0.5 else question.upper()
+            return self.random.choice(PREFIXES) + question + self.random.choice(SUFFIXES)
+        words = question.split()
+        if len(words) > 2:
+            del words[self.random.randrange(len(words))]
+        return self.random.choice(PREFIXES) + ' '.join(words)
+
+    def take(self, n):
+        return [self() for _ in range(n)]
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds."""
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'count': int(ms.size),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def bench_cold_start(data_path=None):
+    """Time each startup phase from scratch, then a warm load of the saved artifact."""
+    import model_store
+    from preprocessing import get_nlp
+    from question_index import QuestionIndex
+
+    data_path = data_path or model_store.DATASET_PATH
+    phases = {}
+
+    def timed(name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        phases[name] = time.perf_counter() - start
+        return result
+
+    data = timed('csv_load', model_store.load_dataset, data_path)
+    timed('spacy_load', get_nlp)
+    timed('preprocess', model_store.preprocess_corpus, data)
+    model, _ = timed('fit', model_store.fit, data)
+    timed('index', QuestionIndex, data['question'], data['processed_question'], data['category'], model[:-1])
+    result = {'rows': len(data), 'phases_s': phases, 'total_s': sum(phases.values())}
+
+    path = model_store.artifact_path(model_store.artifact_key(data_path))
+    if os.path.exists(path):
+        start = time.perf_counter()
+        model_store.load(path)
+        result['artifact_load_s'] = time.perf_counter() - start
+    return result
+
+
+def _client_post(app):
+    client = app.test_client()
+
+    def post(question):
+        response = client.post('/ask', json={'question': question})
+        return response.status_code, response.get_json().get('source')
+    return post
+
+
+def _url_post(url):
+    endpoint = url.rstrip('/') + '/ask'
+
+    def post(question):
+        request = urllib.request.Request(endpoint, data=json.dumps({'question': question}).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read()).get('source')
+    return post
+
+
+def _make_post(app, url):
+    if url:
+        return _url_post(url)
+    return _client_post(app)
+
+
+def bench_latency(app=None, url=None, requests=500, warmup=50, seed=0):
+    """Sequential single-question latency through /ask."""
+    post = _make_post(app, url)
+    questions = QuestionGenerator(seed).take(warmup + requests)
+    for question in questions[:warmup]:
+        post(question)
+
+    latencies = []
+    sources = {}
+    errors = 0
+    for question in questions[warmup:]:
+        start = time.perf_counter()
+        status, source = post(question)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors += 1
+        sources[source] = sources.get(source, 0) + 1
+    result = summarize(latencies)
+    result.update({'errors': errors, 'sources': sources})
+    return result
+
+
+def bench_throughput(app=None, url=None, concurrency=(1, 2, 4, 8, 16), duration=5.0, seed=0):
+    """Sustained /ask throughput for each number of concurrent clients."""
+    results = []
+    for level in concurrency:
+        generators = [QuestionGenerator(seed + worker) for worker in range(level)]
+        lock = threading.Lock()
+        latencies = []
+        errors = [0]
+        deadline = time.perf_counter() + duration
+
+        def client(worker):
+            post = _make_post(app, url)
+            generator = generators[worker]
+            local = []
+            failed = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status, _ = post(generator())
+                except Exception:
+                    status = None
+                local.append(time.perf_counter() - start)
+                if status != 200:
+                    failed += 1
+            with lock:
+                latencies.extend(local)
+                errors[0] += failed
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(level) as pool:
+            list(pool.map(client, range(level)))
+        elapsed = time.perf_counter() - start
+
+        result = {'concurrency': level, 'elapsed_s': elapsed, 'errors': errors[0],
+                  'requests_per_s': len(latencies) / elapsed}
+        result.update(summarize(latencies))
+        results.append(result)
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': {name: importlib.metadata.version(name) for name in ('flask', 'scikit-learn', 'spacy')},
+        'args': {k: v for k, v in vars(args).items() if k != 'output'},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('suite', choices=['all', 'cold-start', 'latency', 'throughput'])
+    parser.add_argument('--output', default='bench_results.json', help='JSON results file')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=500, help='latency: measured requests')
+    parser.add_argument('--warmup', type=int, default=50, help='latency: unmeasured requests first')
+    parser.add_argument('--concurrency', default='1,2,4,8,16', help='throughput: comma-separated levels')
+    parser.add_argument('--duration', type=float, default=5.0, help='throughput: seconds per level')
+    args = parser.parse_args()
+
+    results = {'meta': metadata(args)}
+    # Cold start goes first, before anything else has loaded SpaCy in this process
+    if args.suite in ('all', 'cold-start'):
+        results['cold_start'] = bench_cold_start()
+        print('cold start: %.2fs' % results['cold_start']['total_s'], file=sys.stderr)
+
+    app = None
+    if args.suite in ('all', 'latency', 'throughput') and not args.url:
+        from app import create_app
+        app = create_app()
+
+    if args.suite in ('all', 'latency'):
+        results['latency'] = bench_latency(app, args.url, args.requests, args.warmup, args.seed)
+        print('latency: p50 %.2fms p99 %.2fms' % (results['latency']['p50_ms'], results['latency']['p99_ms']),
+              file=sys.stderr)
+    if args.suite in ('all', 'throughput'):
+        levels = [int(level) for level in args.concurrency.split(',')]
+        results['throughput'] = bench_throughput(app, args.url, levels, args.duration, args.seed)
+        for level in results['throughput']:
+            print('concurrency %d: %.1f req/s' % (level['concurrency'], level['requests_per_s']), file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    print('wrote %s' % args.output, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Gunicorn settings for serving wsgi:app.
+
+Models are loaded once in the master (preload_app) and shared copy-on-write
+by the forked workers. With LOAD_ASYNC=1 preloading is off (WEB_PRELOAD=0)
+and each worker loads its own models in the background, since the loader
+thread would otherwise run in the master only. Throughput scales with WEB_WORKERS; WEB_THREADS per
+worker overlap request I/O.
+
+Workers share /metrics totals and profiler settings through files in
+METRICS_DIR, a fresh temporary directory unless set in the environment.
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+# One BLAS/OpenMP thread per worker so processes do not oversubscribe cores
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+
+# Set before wsgi:app is imported; metrics reads it at import time
+if not os.environ.get('METRICS_DIR'):
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='edpython-metrics-')
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+# The LOAD_ASYNC loader thread does not survive the fork into workers
+load_async = os.environ.get('LOAD_ASYNC', '0') == '1'
+preload_app = os.environ.get('WEB_PRELOAD', '0' if load_async else '1') == '1'
+if preload_app and load_async:
+    raise RuntimeError('LOAD_ASYNC=1 needs WEB_PRELOAD=0: workers would never see the loaded models')
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+keepalive = 5
+
+
+def on_starting(server):
+    # Totals restart with the server; drop files left by a previous run
+    metrics_dir = os.environ['METRICS_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for pattern in ('metrics-*.json', 'profile-*'):
+        for path in glob.glob(os.path.join(metrics_dir, pattern)):
+            os.unlink(path)
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,333 @@
+"""Out-of-core, incremental training for a growing question dataset.
+
+    python incremental.py train [--data questions_dataset.csv] [--epochs 5] [--warm-start] [--no-baseline]
+
+The CSV is streamed in chunks and never held in memory as a whole.
+Preprocessed rows are cached in SQLite keyed by a hash of the question
+text and the preprocessing config, so only new or changed rows go through
+SpaCy. Features live in a fixed-size hashed space (HashingVectorizer with
+IDF weights counted chunk by chunk) and the classifier is an SGD-trained
+linear SVM fitted with partial_fit.
+
+--warm-start continues from the published incremental model and trains on
+the (question, category) pairs it has not been trained on yet, which
+covers appended rows, relabelled rows and rows cached by an interrupted
+run; it falls back to a full pass over the cache when the category set
+has changed. Nothing is published when there is nothing new to train on.
+
+Rows are held out by a hash of their question text (test_mask), so a row
+never moves from the test side to the training side as the dataset grows,
+as it would with model_store's positional train_test_split. For comparison
+a LinearSVC pipeline like model_store's is fitted in memory on the same
+training rows and scored on the same held-out rows, so baseline_accuracy
+is reported on every run. That holds the preprocessed training text in
+memory; with --no-baseline it is skipped and baseline_accuracy is null.
+
+Rows are shuffled within each chunk only; keep --chunk-size well above
+the number of rows per category when the CSV is sorted by category.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import LabelEncoder
+
+import model_store
+from preprocessing import PREPROCESS_CONFIG, preprocess_batch
+from question_index import QuestionIndex
+
+CHUNK_SIZE = 10000
+# Hashed feature space; the classifier holds n_categories * N_FEATURES weights
+N_FEATURES = 2 ** 16
+CACHE_NAME = 'preprocess_cache.sqlite'
+
+# SQLite's default limit on bound parameters is 999 in older builds
+_SQL_BATCH = 900
+# One question in TEST_MODULUS is held out for evaluation
+TEST_MODULUS = 5
+
+
+class PreprocessCache:
+    """Persistent question hash -> preprocessed text."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, processed TEXT NOT NULL)')
+        self._salt = json.dumps(PREPROCESS_CONFIG, sort_keys=True).encode() + b'\0'
+
+    def row_hash(self, question):
+        return hashlib.sha1(self._salt + question.encode('utf-8')).hexdigest()
+
+    def get_many(self, hashes):
+        found = {}
+        for start in range(0, len(hashes), _SQL_BATCH):
+            batch = hashes[start:start + _SQL_BATCH]
+            query = 'SELECT hash, processed FROM rows WHERE hash IN (%s)' % ','.join('?' * len(batch))
+            found.update(self.db.execute(query, batch))
+        return found
+
+    def put_many(self, items):
+        self.db.executemany('INSERT OR REPLACE INTO rows (hash, processed) VALUES (?, ?)', items)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE, **kwargs):
+    """Stream the dataset as DataFrames of at most chunk_size rows."""
+    return pd.read_csv(path, header=None, names=['question', 'category'], encoding='utf-8-sig',
+                       dtype=str, chunksize=chunk_size, **kwargs)
+
+
+def iter_processed_chunks(path, cache, chunk_size=CHUNK_SIZE, stats=None):
+    """(row offset, chunk) with a 'processed_question' column added.
+
+    Cache misses (new or changed rows) are preprocessed and written back.
+    """
+    offset = 0
+    for chunk in iter_chunks(path, chunk_size):
+        questions = list(chunk['question'].fillna(''))
+        hashes = [cache.row_hash(question) for question in questions]
+        found = cache.get_many(list(dict.fromkeys(hashes)))
+        missing = {h: question for h, question in zip(hashes, questions) if h not in found}
+        if missing:
+            processed = preprocess_batch(list(missing.values()))
+            cache.put_many(list(zip(missing, processed)))
+            found.update(zip(missing, processed))
+        chunk = chunk.assign(processed_question=[found[h] for h in hashes])
+        if stats is not None:
+            stats['preprocessed'] = stats.get('preprocessed', 0) + len(missing)
+        yield offset, chunk
+        offset += len(chunk)
+
+
+def scan_labels(path, chunk_size=CHUNK_SIZE):
+    """Row count and sorted category set, reading only the category column."""
+    rows = 0
+    categories = set()
+    for chunk in iter_chunks(path, chunk_size, usecols=['category']):
+        rows += len(chunk)
+        categories.update(chunk['category'].dropna())
+    return rows, sorted(categories)
+
+
+def test_mask(questions):
+    """Boolean mask of held-out rows, decided by a hash of each question's text.
+
+    A row stays on the same side of the split however the dataset grows or
+    is reordered, and duplicate questions never straddle it.
+    """
+    return np.fromiter(
+        (int.from_bytes(hashlib.sha1(question.encode('utf-8')).digest()[:8], 'big') % TEST_MODULUS == 0
+         for question in questions),
+        dtype=bool, count=len(questions))
+
+
+def pair_hashes(questions, categories):
+    """64-bit hash of each (question, category) pair, to tell which rows a model was trained on."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.sha1(('%s\0%s' % pair).encode('utf-8')).digest()[:8], 'big')
+         for pair in zip(questions, categories)),
+        dtype=np.uint64, count=len(questions))
+
+
+def prepare(path, cache, hasher, rows, chunk_size, stats, train_rows=None):
+    """Bring the cache up to date.
+
+    Returns the held-out mask, the pair hash of every row and the hashed
+    document frequencies. If train_rows is a list, the (processed question,
+    category) of every training row is appended to it.
+    """
+    is_test = np.zeros(rows, dtype=bool)
+    pairs = np.zeros(rows, dtype=np.uint64)
+    document_frequency = np.zeros(hasher.n_features, dtype=np.int64)
+    for offset, chunk in iter_processed_chunks(path, cache, chunk_size, stats):
+        questions = chunk['question'].fillna('')
+        chunk_is_test = test_mask(questions)
+        is_test[offset:offset + len(chunk)] = chunk_is_test
+        pairs[offset:offset + len(chunk)] = pair_hashes(questions, chunk['category'].fillna(''))
+        counts = hasher.transform(chunk['processed_question'])
+        document_frequency += np.bincount(counts.indices, minlength=hasher.n_features)
+        if train_rows is not None:
+            train = chunk[~chunk_is_test]
+            train_rows.extend(zip(train['processed_question'], train['category']))
+    return is_test, pairs, document_frequency
+
+
+def idf_transformer(document_frequency, rows):
+    tfidf = TfidfTransformer()
+    # Smoothed IDF, as TfidfVectorizer computes it
+    tfidf.idf_ = np.log((1 + rows) / (1 + document_frequency)) + 1
+    return tfidf
+
+
+def train(data_path=model_store.DATASET_PATH, artifact_dir=model_store.ARTIFACT_DIR, epochs=5,
+          chunk_size=CHUNK_SIZE, warm_start=False, cache_path=None, n_features=N_FEATURES, baseline=True):
+    """Train, evaluate and publish an incremental model.
+
+    Returns (artifact path, report); the path is None when there was
+    nothing to train on and nothing was published.
+    """
+    started = time.perf_counter()
+    rows, categories = scan_labels(data_path, chunk_size)
+    label_encoder = LabelEncoder().fit(categories)
+    classes = np.arange(len(label_encoder.classes_))
+
+    previous = _previous_artifact(artifact_dir) if warm_start else None
+    if previous is not None and list(previous['label_encoder'].classes_) != categories:
+        previous = None
+
+    if previous is None:
+        hasher = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+    else:
+        hasher = previous['model'][0]
+
+    cache = PreprocessCache(cache_path or os.path.join(artifact_dir, CACHE_NAME))
+    stats = {}
+    train_rows = [] if baseline else None
+    try:
+        is_test, pairs, document_frequency = prepare(data_path, cache, hasher, rows, chunk_size, stats, train_rows)
+        baseline_model = None
+        if train_rows:
+            # LinearSVC quality baseline on the same training rows
+            processed, labels = zip(*train_rows)
+            baseline_model = model_store.new_model().fit(processed, label_encoder.transform(labels))
+            del train_rows, processed, labels
+        if previous is None:
+            tfidf = idf_transformer(document_frequency, rows)
+            classifier = SGDClassifier(loss='hinge', alpha=1e-4, random_state=42)
+            train_mask = ~is_test
+        else:
+            # Keep the feature weighting the previous classifier was trained with
+            tfidf, classifier = previous['model'][1], previous['model'][-1]
+            train_mask = ~is_test & ~np.isin(pairs, previous['trained_pairs'])
+        model = make_pipeline(hasher, tfidf, classifier)
+        vectorizer = model[:-1]
+
+        epochs_run = epochs if train_mask.any() else 0
+        rng = np.random.RandomState(42)
+        for epoch in range(epochs_run):
+            for offset, chunk in iter_processed_chunks(data_path, cache, chunk_size):
+                chunk = chunk[train_mask[offset:offset + len(chunk)]]
+                if chunk.empty:
+                    continue
+                order = rng.permutation(len(chunk))
+                X = vectorizer.transform(chunk['processed_question'].iloc[order])
+                y = label_encoder.transform(chunk['category'].iloc[order])
+                classifier.partial_fit(X, y, classes=classes)
+
+        # Held-out accuracy, in the same pass as the index build
+        scores = {'correct': 0, 'baseline_correct': 0, 'total': 0}
+
+        def evaluated_chunks():
+            for offset, chunk in iter_processed_chunks(data_path, cache, chunk_size):
+                test = chunk[is_test[offset:offset + len(chunk)]]
+                if not test.empty:
+                    expected = test['category'].to_numpy()
+                    predicted = label_encoder.inverse_transform(
+                        classifier.predict(vectorizer.transform(test['processed_question'])))
+                    scores['correct'] += int((predicted == expected).sum())
+                    if baseline_model is not None:
+                        predicted = label_encoder.inverse_transform(baseline_model.predict(test['processed_question']))
+                        scores['baseline_correct'] += int((predicted == expected).sum())
+                    scores['total'] += len(test)
+                yield chunk['question'], chunk['processed_question'], chunk['category']
+
+        if epochs_run:
+            index = QuestionIndex.from_chunks(evaluated_chunks(), vectorizer)
+        else:
+            # Nothing to publish; evaluate only
+            for _ in evaluated_chunks():
+                pass
+    finally:
+        cache.close()
+
+    key = model_store.artifact_key(data_path)
+    total = scores['total']
+    report = {
+        'rows': rows,
+        'preprocessed_rows': stats.get('preprocessed', 0),
+        'warm_start': previous is not None,
+        'epochs': epochs_run,
+        'test_rows': total,
+        'accuracy': scores['correct'] / total if total else None,
+        'baseline_accuracy': scores['baseline_correct'] / total if baseline_model is not None and total else None,
+        'train_seconds': time.perf_counter() - started,
+    }
+    if not epochs_run:
+        # Same model as the one already published; servers keep it
+        return None, report
+    path = os.path.join(artifact_dir, 'incremental-%s-%d.joblib' % (key, int(time.time() * 1000)))
+    artifact = {
+        'version': model_store.ARTIFACT_VERSION,
+        'key': key,
+        'name': os.path.basename(path),
+        'created': time.time(),
+        'preprocess_config': dict(PREPROCESS_CONFIG),
+        'trainer': 'incremental',
+        'report': report,
+        'model': model,
+        'label_encoder': label_encoder,
+        'index': index,
+        # Pairs trained on, so a warm start can tell which rows are new or relabelled
+        'trained_pairs': np.unique(pairs[~is_test]),
+    }
+    model_store.save(artifact, path)
+    model_store.publish(path, key, artifact_dir)
+    # Keep the full artifact for this dataset as a fallback
+    model_store.prune([path, model_store.artifact_path(key, artifact_dir)], artifact_dir)
+    return path, report
+
+
+def _previous_artifact(artifact_dir):
+    pointer = model_store.read_current(artifact_dir)
+    if pointer is None:
+        return None
+    path = os.path.join(artifact_dir, pointer['path'])
+    if not os.path.exists(path):
+        return None
+    # Not memory-mapped: partial_fit updates the classifier weights in place
+    artifact = joblib.load(path)
+    if artifact.get('trainer') != 'incremental' or artifact['version'] != model_store.ARTIFACT_VERSION:
+        return None
+    return artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    train_cmd = sub.add_parser('train', help='train, evaluate and publish an incremental model')
+    train_cmd.add_argument('--data', default=model_store.DATASET_PATH)
+    train_cmd.add_argument('--artifact-dir', default=model_store.ARTIFACT_DIR)
+    train_cmd.add_argument('--epochs', type=int, default=5)
+    train_cmd.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    train_cmd.add_argument('--n-features', type=int, default=N_FEATURES, help='size of the hashed feature space')
+    train_cmd.add_argument('--warm-start', action='store_true',
+                           help='continue from the published incremental model using new or relabelled rows only')
+    train_cmd.add_argument('--no-baseline', dest='baseline', action='store_false',
+                           help='skip the in-memory LinearSVC baseline')
+    args = parser.parse_args()
+
+    path, report = train(args.data, args.artifact_dir, args.epochs, args.chunk_size, args.warm_start,
+                         n_features=args.n_features, baseline=args.baseline)
+    print(json.dumps(report, indent=2))
+    if path is None:
+        print('nothing new to train on; published model unchanged', file=sys.stderr)
+    else:
+        print('published %s' % path, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""Minimal metrics rendered in the Prometheus text format.
+
+Each process records into its own registry. With METRICS_DIR set (the
+gunicorn config sets it), every process also writes a snapshot to
+METRICS_DIR/metrics-<pid>.json about once per METRICS_FLUSH_INTERVAL
+seconds, and /metrics merges the snapshots of all workers, so any worker
+answers a scrape with the totals. Counters and histograms are summed,
+including those of workers that have exited; gauges take the maximum over
+live workers. Other workers' values can be up to one flush interval old.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from background import PerProcessThread
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+
+# Seconds; fine-grained at the low end where most stages land
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = ('%s="%s"' % (k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+               for k, v in pairs)
+    return '{%s}' % ','.join(escaped)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def combine(a, b):
+        return a + b
+
+    def render(self, values=None):
+        if values is None:
+            values = self.snapshot()
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s %s' % (self.name, self.kind)]
+        lines.extend(self._render_items(sorted(values.items())))
+        return lines
+
+    def _render_items(self, items):
+        return ['%s%s %r' % (self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            # Exported as 0 before the first increment
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @staticmethod
+    def combine(a, b):
+        return max(a, b)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def combine(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', repr(bound))])
+                lines.append('%s_bucket%s %d' % (self.name, labels, cumulative))
+            labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+            lines.append('%s_bucket%s %d' % (self.name, labels, count))
+            lines.append('%s_sum%s %r' % (self.name, _format_labels(self.labelnames, key), total))
+            lines.append('%s_count%s %d' % (self.name, _format_labels(self.labelnames, key), count))
+        return lines
+
+
+def write_file_atomic(path, text):
+    """Replace path with text so concurrent readers only ever see a complete file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _process_path(pid):
+    return os.path.join(METRICS_DIR, 'metrics-%d.json' % pid)
+
+
+def flush():
+    """Write this process's values to METRICS_DIR."""
+    data = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+            for metric in REGISTRY}
+    write_file_atomic(_process_path(os.getpid()), json.dumps(data))
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Removed since the glob
+        return {}
+
+
+def collect():
+    """Values of every metric by name, merged across processes when METRICS_DIR is set."""
+    if METRICS_DIR is None:
+        return {metric.name: metric.snapshot() for metric in REGISTRY}
+    flush()
+    by_name = {metric.name: metric for metric in REGISTRY}
+    merged = {name: {} for name in by_name}
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        for name, items in _read_snapshot(path).items():
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            values = merged[name]
+            for key, value in items:
+                key = tuple(key)
+                values[key] = value if key not in values else metric.combine(values[key], value)
+    return merged
+
+
+def mark_process_dead(pid):
+    """Drop an exited worker's gauges; its counters and histograms still count toward the totals."""
+    if METRICS_DIR is None:
+        return
+    path = _process_path(pid)
+    data = _read_snapshot(path)
+    if data:
+        gauges = {metric.name for metric in REGISTRY if metric.kind == 'gauge'}
+        write_file_atomic(path, json.dumps({name: items for name, items in data.items() if name not in gauges}))
+
+
+def ensure_flusher():
+    """Start this process's background flush thread if METRICS_DIR is set; cheap to call per request."""
+    if METRICS_DIR is not None:
+        _flusher.ensure_started()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            logger.exception("Could not write metrics to %s", METRICS_DIR)
+
+
+_flusher = PerProcessThread(_flush_forever, 'metrics-flusher')
+
+
+def render():
+    values = collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(values[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+STAGE_SECONDS = Histogram(
+    'edpython_stage_seconds', 'Time spent in each stage of answering questions.', ['stage'])
+REQUEST_SECONDS = Histogram(
+    'edpython_request_seconds', 'End-to-end request latency.', ['endpoint', 'status'])
+ANSWERS = Counter(
+    'edpython_answers_total', 'Questions answered, by predicted category and answering path.',
+    ['category', 'source'])
+ERRORS = Counter(
+    'edpython_errors_total', 'Failed or unanswerable questions, by kind.', ['kind'])
+MODEL_RELOADS = Counter(
+    'edpython_model_reloads_total', 'Published model artifacts swapped in, by result.', ['result'])
+BATCH_QUEUE_WAIT_SECONDS = Histogram(
+    'edpython_batch_queue_wait_seconds', 'Time questions wait in the micro-batch queue.')
+BATCH_SIZE = Histogram(
+    'edpython_batch_size', 'Questions per micro-batch.', buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+BATCH_REJECTED = Counter(
+    'edpython_batch_rejected_total', 'Questions turned away because the micro-batch queue was full.')
+PREPROCESS_CACHE = Counter(
+    'edpython_preprocess_cache_total', 'Preprocessing cache lookups for incoming questions, by result.',
+    ['result'])
+STARTUP_SECONDS = Gauge(
+    'edpython_startup_phase_seconds', 'Duration of each startup phase (slowest process).', ['phase'])
+
+
+@contextmanager
+def startup_phase(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_SECONDS.set(time.perf_counter() - start, phase=phase)
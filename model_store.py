@@ -0,0 +1,232 @@
+"""Versioned on-disk artifact for the question classifier.
+
+An artifact holds the fitted pipeline, the label encoder, the
+preprocessed corpus and the question index built from it. It is keyed by a hash of the dataset and the
+preprocessing config, so a changed CSV or SpaCy setup makes it stale.
+
+    python model_store.py build [--data questions_dataset.csv] [--force]
+
+The artifact servers should use is named by artifacts/current.json;
+publishing a new one there swaps it into running servers.
+"""
+import argparse
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import LabelEncoder
+from sklearn.svm import LinearSVC
+
+from metrics import startup_phase
+from preprocessing import PREPROCESS_CONFIG, preprocess_text
+from question_index import MAX_PER_CATEGORY, QuestionIndex
+
+# Bump when the artifact layout or the training split changes
+ARTIFACT_VERSION = 5
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BASE_DIR, 'questions_dataset.csv')
+ARTIFACT_DIR = os.environ.get('MODEL_ARTIFACT_DIR', os.path.join(BASE_DIR, 'artifacts'))
+CURRENT_POINTER = 'current.json'
+
+
+def load_dataset(path=DATASET_PATH):
+    # The CSV has no header row and starts with a BOM; columns are 'question', 'category'
+    return pd.read_csv(path, header=None, names=['question', 'category'],
+                       encoding='utf-8-sig', dtype=str)
+
+
+def artifact_key(path=DATASET_PATH):
+    """Hash of the dataset bytes, preprocessing and index config and library versions."""
+    h = hashlib.sha256()
+    h.update(str(ARTIFACT_VERSION).encode())
+    h.update(json.dumps(PREPROCESS_CONFIG, sort_keys=True).encode())
+    h.update(str(MAX_PER_CATEGORY).encode())
+    h.update(sklearn.__version__.encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def artifact_path(key, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, 'model-%s.joblib' % key)
+
+
+def preprocess_corpus(data):
+    # Preprocess Questions
+    data['processed_question'] = data['question'].apply(preprocess_text)
+
+
+def new_model():
+    """The unfitted TF-IDF + LinearSVC pipeline."""
+    return make_pipeline(TfidfVectorizer(), LinearSVC())
+
+
+def fit(data):
+    """Fit the label encoder and pipeline on an already preprocessed corpus."""
+    # Encode Categories
+    label_encoder = LabelEncoder()
+    data['category_encoded'] = label_encoder.fit_transform(data['category'])
+
+    # Split Data
+    X_train, X_test, y_train, y_test = train_test_split(
+        data['processed_question'], data['category_encoded'], test_size=0.2, random_state=42
+    )
+
+    # Build Model Pipeline
+    model = new_model()
+    model.fit(X_train, y_train)
+    return model, label_encoder
+
+
+def train(data):
+    """Preprocess the corpus and fit the label encoder and pipeline on it."""
+    preprocess_corpus(data)
+    return fit(data)
+
+
+def build(data_path=DATASET_PATH, artifact_dir=ARTIFACT_DIR):
+    """Train from the CSV and write the artifact atomically. Returns the artifact."""
+    key = artifact_key(data_path)
+    with startup_phase('csv_load'):
+        data = load_dataset(data_path)
+    with startup_phase('preprocess'):
+        preprocess_corpus(data)
+    with startup_phase('fit'):
+        model, label_encoder = fit(data)
+    with startup_phase('index'):
+        index = QuestionIndex(data['question'], data['processed_question'], data['category'], model[:-1])
+
+    path = artifact_path(key, artifact_dir)
+    # Fixed-width numpy string arrays so the corpus can be memory-mapped on load
+    artifact = {
+        'version': ARTIFACT_VERSION,
+        'key': key,
+        # File name as published in current.json
+        'name': os.path.basename(path),
+        'created': time.time(),
+        'preprocess_config': dict(PREPROCESS_CONFIG),
+        'model': model,
+        'label_encoder': label_encoder,
+        'questions': np.asarray(data['question'], dtype=str),
+        'processed_questions': np.asarray(data['processed_question'], dtype=str),
+        'categories': np.asarray(data['category'], dtype=str),
+        'index': index,
+    }
+
+    with startup_phase('save'):
+        save(artifact, path)
+    publish(path, key, artifact_dir)
+    prune([path], artifact_dir)
+    return artifact
+
+
+def _write_atomic(path, write):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save(artifact, path):
+    """Write an artifact so readers only ever see a complete file."""
+    _write_atomic(path, lambda tmp_path: joblib.dump(artifact, tmp_path))
+
+
+def publish(path, key, artifact_dir=ARTIFACT_DIR):
+    """Point current.json at an artifact; running servers pick it up on their next check."""
+    pointer = {'path': os.path.basename(path), 'key': key, 'published': time.time()}
+
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(pointer, f)
+    _write_atomic(os.path.join(artifact_dir, CURRENT_POINTER), write)
+
+
+def read_current(artifact_dir=ARTIFACT_DIR):
+    """The published pointer, or None if nothing has been published."""
+    try:
+        with open(os.path.join(artifact_dir, CURRENT_POINTER)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def prune(keep_paths, artifact_dir=ARTIFACT_DIR):
+    # Workers still mapping an old file keep their pages until they exit
+    for path in glob.glob(os.path.join(artifact_dir, '*.joblib')):
+        if path not in keep_paths:
+            os.unlink(path)
+
+
+def load(path):
+    """Load an artifact, memory-mapping its numpy arrays read-only."""
+    return joblib.load(path, mmap_mode='r')
+
+
+def load_current(data_path=DATASET_PATH, artifact_dir=ARTIFACT_DIR):
+    """Load the published artifact if it was trained on the current dataset, else load_or_build."""
+    pointer = read_current(artifact_dir)
+    if pointer is not None and pointer['key'] == artifact_key(data_path):
+        path = os.path.join(artifact_dir, pointer['path'])
+        if os.path.exists(path):
+            return load(path)
+    return load_or_build(data_path, artifact_dir)
+
+
+def load_or_build(data_path=DATASET_PATH, artifact_dir=ARTIFACT_DIR):
+    """Return the artifact for the current dataset, rebuilding it if stale or missing."""
+    key = artifact_key(data_path)
+    path = artifact_path(key, artifact_dir)
+    if os.path.exists(path):
+        return load(path)
+
+    # Several workers may start at once; only one of them trains
+    os.makedirs(artifact_dir, exist_ok=True)
+    with open(os.path.join(artifact_dir, '.build.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            return load(path)
+        build(data_path, artifact_dir)
+    return load(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help='train and write the model artifact')
+    build_cmd.add_argument('--data', default=DATASET_PATH)
+    build_cmd.add_argument('--artifact-dir', default=ARTIFACT_DIR)
+    build_cmd.add_argument('--force', action='store_true', help='rebuild even if up to date')
+    args = parser.parse_args()
+
+    key = artifact_key(args.data)
+    path = artifact_path(key, args.artifact_dir)
+    if args.force or not os.path.exists(path):
+        build(args.data, args.artifact_dir)
+        print('built %s' % path)
+    else:
+        print('up to date: %s' % path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+from metrics import STAGE_SECONDS, startup_phase
+from model_store import load_current
+from preprocessing import get_nlp, preprocess_questions
+
+
+class Predictor:
+    """The loaded model and question index.
+
+    Nothing here is mutated after construction, so one instance can be
+    shared by every request thread in a worker (and by forked workers).
+    """
+
+    def __init__(self, artifact, nlp_batch_size=64, nlp_n_process=1, index_threshold=0.9):
+        self.artifact = artifact
+        self.model = artifact['model']
+        self.label_encoder = artifact['label_encoder']
+        self.question_index = artifact['index']
+        self.vectorizer, self.classifier = self.model[:-1], self.model[-1]
+        self.nlp_batch_size = nlp_batch_size
+        self.nlp_n_process = nlp_n_process
+        self.index_threshold = index_threshold
+
+    @classmethod
+    def load(cls, config):
+        # Load SpaCy model for NLP
+        with startup_phase('spacy_load'):
+            get_nlp()
+        # Load the published model artifact, rebuilding it if the dataset changed
+        with startup_phase('artifact_load'):
+            artifact = load_current()
+        return cls.from_artifact(artifact, config)
+
+    @classmethod
+    def from_artifact(cls, artifact, config):
+        return cls(
+            artifact,
+            nlp_batch_size=config['NLP_BATCH_SIZE'],
+            nlp_n_process=config['NLP_N_PROCESS'],
+            index_threshold=config['INDEX_THRESHOLD'],
+        )
+
+    def answer_questions(self, questions):
+        """Return (category, source) for each question, in order.
+
+        Exact matches skip NLP; the rest are preprocessed and vectorized together,
+        answered by their nearest corpus question when it is similar enough and
+        by the classifier otherwise.
+        """
+        answers = [None] * len(questions)
+        pending = []
+        with STAGE_SECONDS.time(stage='exact_lookup'):
+            for i, question in enumerate(questions):
+                category = self.question_index.lookup_exact(question)
+                if category is None:
+                    pending.append(i)
+                else:
+                    answers[i] = (category, 'exact')
+        if not pending:
+            return answers
+
+        with STAGE_SECONDS.time(stage='preprocess'):
+            processed = preprocess_questions(
+                [questions[i] for i in pending],
+                batch_size=self.nlp_batch_size,
+                n_process=self.nlp_n_process,
+            )
+        # One vectorized transform over the whole sparse matrix, shared by both paths
+        with STAGE_SECONDS.time(stage='vectorize'):
+            vectors = self.vectorizer.transform(processed)
+        with STAGE_SECONDS.time(stage='nearest'):
+            neighbours, similarities = self.question_index.nearest(vectors)
+        fallback = similarities < self.index_threshold
+        if fallback.any():
+            with STAGE_SECONDS.time(stage='score'):
+                scored = self.classifier.predict(vectors[fallback])
+            with STAGE_SECONDS.time(stage='decode'):
+                predicted = iter(self.label_encoder.inverse_transform(scored))
+        for row, i in enumerate(pending):
+            if fallback[row]:
+                answers[i] = (next(predicted), 'classifier')
+            else:
+                answers[i] = (neighbours[row], 'nearest')
+        return answers
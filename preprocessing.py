@@ -0,0 +1,177 @@
+"""Text preprocessing shared by training and the request hot path.
+
+The "lean" mode loads SpaCy with only what lemmatization needs (tok2vec,
+tagger, attribute_ruler, lemmatizer); "full" loads the whole pipeline
+as before. Check they agree on the training corpus with:
+
+    python preprocessing.py check [--data questions_dataset.csv]
+"""
+import argparse
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import spacy
+
+from metrics import PREPROCESS_CACHE
+
+SPACY_MODEL = "en_core_web_sm"
+PREPROCESS_MODE = os.environ.get('PREPROCESS_MODE', 'lean')
+
+# The parser and NER are not needed for lemma_, is_stop or is_punct
+LEAN_EXCLUDE = ['parser', 'ner', 'senter']
+
+# Everything that changes the output of preprocess_text; part of the model artifact key
+PREPROCESS_CONFIG = {
+    'spacy_model': SPACY_MODEL,
+    'spacy_version': spacy.__version__,
+    'mode': PREPROCESS_MODE,
+    'lowercase': True,
+    'drop_stop': True,
+    'drop_punct': True,
+}
+
+_nlp = None
+_nlp_lock = threading.Lock()
+# SpaCy does not promise that one Language object is safe to call from several
+# threads at once; parallelism comes from worker processes instead
+_nlp_call_lock = threading.Lock()
+
+
+def load_nlp(mode=PREPROCESS_MODE):
+    if mode == 'lean':
+        return spacy.load(SPACY_MODEL, exclude=LEAN_EXCLUDE)
+    if mode == 'full':
+        return spacy.load(SPACY_MODEL)
+    raise ValueError("Unknown preprocessing mode: %r" % mode)
+
+
+def get_nlp():
+    """Load the SpaCy model once per process."""
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                _nlp = load_nlp()
+    return _nlp
+
+
+def _doc_to_text(doc):
+    tokens = [token.lemma_ for token in doc if not token.is_stop and not token.is_punct]
+    return " ".join(tokens)
+
+
+# Preprocessing Function
+def preprocess_text(text, nlp=None):
+    nlp = nlp or get_nlp()
+    with _nlp_call_lock:
+        doc = nlp(text.lower())
+    return _doc_to_text(doc)
+
+
+def preprocess_batch(texts, batch_size=64, n_process=1, nlp=None):
+    """Preprocess many texts with nlp.pipe; same output as preprocess_text, in order."""
+    nlp = nlp or get_nlp()
+    with _nlp_call_lock:
+        docs = list(nlp.pipe((text.lower() for text in texts), batch_size=batch_size, n_process=n_process))
+    return [_doc_to_text(doc) for doc in docs]
+
+
+class LRUCache:
+    """Thread-safe bounded mapping with hit/miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+
+question_cache = LRUCache(int(os.environ.get('PREPROCESS_CACHE_SIZE', 4096)))
+
+
+def normalize_question(text):
+    # Case and whitespace changes do not change the TF-IDF features
+    return " ".join(text.lower().split())
+
+
+def preprocess_questions(texts, batch_size=64, n_process=1):
+    """Cached preprocess_batch; only cache misses go through SpaCy."""
+    keys = [normalize_question(text) for text in texts]
+    results = [question_cache.get(key) for key in keys]
+    missing = [i for i, processed in enumerate(results) if processed is None]
+    PREPROCESS_CACHE.inc(len(keys) - len(missing), result='hit')
+    PREPROCESS_CACHE.inc(len(missing), result='miss')
+    if missing:
+        # Duplicates inside one batch are only parsed once
+        unique = list(dict.fromkeys(keys[i] for i in missing))
+        processed = dict(zip(unique, preprocess_batch(unique, batch_size=batch_size, n_process=n_process)))
+        for key, value in processed.items():
+            question_cache.put(key, value)
+        for i in missing:
+            results[i] = processed[keys[i]]
+    return results
+
+
+def compare_pipelines(texts):
+    """Preprocess texts with the full and lean pipelines.
+
+    Returns a list of (index, text, full_output, lean_output) for every
+    text where the two differ; an empty list means they are equivalent.
+    """
+    full = preprocess_batch(texts, nlp=load_nlp('full'))
+    lean = preprocess_batch(texts, nlp=load_nlp('lean'))
+    return [(i, text, a, b) for i, (text, a, b) in enumerate(zip(texts, full, lean)) if a != b]
+
+
+def main():
+    from model_store import DATASET_PATH, load_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    check_cmd = sub.add_parser('check', help='compare lean and full pipelines on the training corpus')
+    check_cmd.add_argument('--data', default=DATASET_PATH)
+    args = parser.parse_args()
+
+    texts = list(load_dataset(args.data)['question'])
+    diffs = compare_pipelines(texts)
+    for i, text, full, lean in diffs:
+        print('row %d: %r\n  full: %r\n  lean: %r' % (i, text, full, lean))
+    print('%d of %d rows differ' % (len(diffs), len(texts)))
+    return 1 if diffs else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
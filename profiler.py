@@ -0,0 +1,183 @@
+"""Sampling profiler that can be switched on at runtime for a fraction of requests.
+
+While a sampled request runs, a background thread periodically records
+the request thread's Python stack. Stacks are aggregated in the collapsed
+format ("outer;inner;leaf count") that flamegraph.pl and speedscope read.
+Requests that are not sampled pay only for one random() call.
+
+With a shared directory (METRICS_DIR under gunicorn) the profiler works
+server-wide: publish() writes the settings to profile-control.json, which
+every worker polls like the model pointer, and each worker writes its stacks
+to profile-<pid>.txt so collapsed() returns the samples of all workers.
+"""
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from background import FilePoller, PerProcessThread
+from metrics import write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+# Bound on distinct stacks kept between resets
+MAX_STACKS = 10000
+CONTROL_NAME = 'profile-control.json'
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+
+
+def _parse_collapsed(text, stacks):
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack:
+            stacks[stack] += int(count)
+
+
+class SamplingProfiler:
+    def __init__(self, rate=0.0, interval_ms=5.0, shared_dir=None, poll_interval=1.0):
+        self.rate = rate
+        self.interval = interval_ms / 1000.0
+        self.samples = 0
+        self.dropped = 0
+        self.shared_dir = shared_dir
+        self.poll_interval = poll_interval
+        self._stacks = Counter()
+        self._tracked = set()
+        self._lock = threading.Lock()
+        self._sampler = PerProcessThread(self._run, 'sampling-profiler')
+        self._control = None
+        if shared_dir is not None:
+            self._control = FilePoller(os.path.join(shared_dir, CONTROL_NAME), poll_interval, self._apply_control)
+        self._resets = 0
+        self._next_dump = 0.0
+        self._dumped_samples = 0
+
+    def configure(self, rate=None, interval_ms=None, reset=False):
+        with self._lock:
+            if rate is not None:
+                self.rate = min(max(float(rate), 0.0), 1.0)
+            if interval_ms is not None:
+                self.interval = max(float(interval_ms), 0.1) / 1000.0
+            if reset:
+                self._stacks.clear()
+                self.samples = self.dropped = 0
+                self._dumped_samples = 0
+        if reset and self.shared_dir is not None:
+            try:
+                os.unlink(self._stacks_path())
+            except FileNotFoundError:
+                pass
+
+    def publish(self, rate=None, interval_ms=None, reset=False):
+        """configure(), and with a shared directory apply the same settings in every worker."""
+        self.configure(rate, interval_ms, reset)
+        if self.shared_dir is None:
+            return
+        with self._lock:
+            self._resets += int(reset)
+            control = {'rate': self.rate, 'interval_ms': self.interval * 1000.0, 'resets': self._resets}
+        write_file_atomic(os.path.join(self.shared_dir, CONTROL_NAME), json.dumps(control))
+
+    def maybe_reload_control(self):
+        """Apply newly published settings; checks the control file at most once per poll_interval."""
+        return self._control is not None and self._control.poll()
+
+    def _apply_control(self, mtime):
+        try:
+            with open(self._control.path) as f:
+                control = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            reset = control['resets'] != self._resets
+            self._resets = control['resets']
+        self.configure(control['rate'], control['interval_ms'], reset)
+        return True
+
+    def should_sample(self):
+        return self.rate > 0 and random.random() < self.rate
+
+    def start_request(self):
+        """Start sampling the calling thread; pair with stop_request."""
+        self._sampler.ensure_started()
+        with self._lock:
+            self._tracked.add(threading.get_ident())
+
+    def stop_request(self):
+        with self._lock:
+            self._tracked.discard(threading.get_ident())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                tracked = list(self._tracked)
+            if not tracked:
+                continue
+            frames = sys._current_frames()
+            for ident in tracked:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._record(frame)
+            if self.shared_dir is not None and time.monotonic() >= self._next_dump:
+                self._next_dump = time.monotonic() + self.poll_interval
+                try:
+                    self._dump()
+                except OSError:
+                    logger.exception("Could not write profiler stacks to %s", self.shared_dir)
+
+    def _record(self, frame):
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        stack = ';'.join(reversed(names))
+        with self._lock:
+            self.samples += 1
+            if stack in self._stacks or len(self._stacks) < MAX_STACKS:
+                self._stacks[stack] += 1
+            else:
+                self.dropped += 1
+
+    def _stacks_path(self):
+        return os.path.join(self.shared_dir, 'profile-%d.txt' % os.getpid())
+
+    def _local_collapsed(self):
+        with self._lock:
+            items = self._stacks.most_common()
+        return ''.join('%s %d\n' % (stack, count) for stack, count in items)
+
+    def _dump(self):
+        if self.samples == self._dumped_samples:
+            return
+        self._dumped_samples = self.samples
+        write_file_atomic(self._stacks_path(), self._local_collapsed())
+
+    def collapsed(self):
+        """Samples so far in collapsed-stack format, one "stack count" per line."""
+        if self.shared_dir is None:
+            return self._local_collapsed()
+        self._dump()
+        stacks = Counter()
+        for path in glob.glob(os.path.join(self.shared_dir, 'profile-*.txt')):
+            try:
+                with open(path) as f:
+                    _parse_collapsed(f.read(), stacks)
+            except OSError:
+                # Removed by a reset since the glob
+                continue
+        return ''.join('%s %d\n' % (stack, count) for stack, count in stacks.most_common())
+
+    def info(self):
+        with self._lock:
+            return {'rate': self.rate, 'interval_ms': self.interval * 1000.0,
+                    'samples': self.samples, 'dropped': self.dropped, 'stacks': len(self._stacks)}
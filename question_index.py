@@ -0,0 +1,109 @@
+"""Fast path ahead of the classifier, built from the training corpus.
+
+Two lookups, cheapest first:
+
+* exact: hashed table of normalized question text -> category; needs no NLP.
+* nearest: cosine nearest neighbour over the TF-IDF vectors of corpus
+  exemplars, used when the best similarity clears the configured threshold.
+
+Anything else falls through to the classifier.
+
+Memory and per-request cost are bounded at build time. The exact table
+keeps a 64-bit digest and a category code per distinct question (roughly
+100 bytes each), so it still grows with the corpus. The nearest-neighbour
+matrix keeps at most INDEX_MAX_PER_CATEGORY distinct exemplars per
+category; each lookup is a sparse product against those rows only.
+INDEX_MAX_PER_CATEGORY=0 leaves the matrix out and sends every question
+the exact table misses to the classifier.
+"""
+import hashlib
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from preprocessing import normalize_question
+
+# Which path answered a question, reported in responses
+SOURCES = ('exact', 'nearest', 'classifier')
+
+MAX_PER_CATEGORY = int(os.environ.get('INDEX_MAX_PER_CATEGORY', 500))
+
+
+def _digest(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class QuestionIndex:
+    def __init__(self, questions, processed_questions, categories, vectorizer, max_per_category=MAX_PER_CATEGORY):
+        self._build([(questions, processed_questions, categories)], vectorizer, max_per_category)
+
+    @classmethod
+    def from_chunks(cls, chunks, vectorizer, max_per_category=MAX_PER_CATEGORY):
+        """Build from an iterable of (questions, processed_questions, categories) chunks."""
+        index = cls.__new__(cls)
+        index._build(chunks, vectorizer, max_per_category)
+        return index
+
+    def _build(self, chunks, vectorizer, max_per_category):
+        labels = {}
+        exact = {}
+        ambiguous = set()
+        # Processed-text digest -> exemplar row; only kept exemplars are tracked
+        exemplars = {}
+        exemplar_codes = []
+        per_category = {}
+        matrices = []
+        for questions, processed_questions, chunk_categories in chunks:
+            processed_questions = list(processed_questions)
+            rows = []
+            for i, (question, category) in enumerate(zip(questions, chunk_categories)):
+                code = labels.setdefault(str(category), len(labels))
+                # Questions that appear with more than one category are left to the classifier
+                key = _digest(normalize_question(question))
+                if exact.setdefault(key, code) != code:
+                    ambiguous.add(key)
+                if not max_per_category:
+                    continue
+                key = _digest(processed_questions[i])
+                row = exemplars.get(key)
+                if row is not None:
+                    # Same features as a kept exemplar: a duplicate, or ambiguous if the category differs
+                    if exemplar_codes[row] != code:
+                        exemplar_codes[row] = -1
+                elif per_category.get(code, 0) < max_per_category:
+                    exemplars[key] = len(exemplar_codes)
+                    exemplar_codes.append(code)
+                    per_category[code] = per_category.get(code, 0) + 1
+                    rows.append(i)
+            if rows:
+                # Vectorizer rows are L2-normalized, so a dot product is the cosine similarity
+                matrices.append(vectorizer.transform([processed_questions[i] for i in rows]))
+        for key in ambiguous:
+            del exact[key]
+        self.exact = exact
+        self.labels = np.array(list(labels), dtype=str)
+        codes = np.array(exemplar_codes, dtype=np.int32)
+        if matrices:
+            self.matrix = sp.vstack(matrices).tocsr()[codes >= 0]
+            self.codes = codes[codes >= 0]
+        else:
+            self.matrix = None
+            self.codes = codes
+
+    def lookup_exact(self, question):
+        code = self.exact.get(_digest(normalize_question(question)))
+        return None if code is None else self.labels[code]
+
+    def nearest(self, vectors):
+        """Best exemplar match for each row of a sparse matrix: (categories, similarities)."""
+        if self.matrix is None or self.matrix.shape[0] == 0:
+            return np.full(vectors.shape[0], None), np.zeros(vectors.shape[0])
+        similarities = (vectors @ self.matrix.T).tocsr()
+        best = np.asarray(similarities.argmax(axis=1)).ravel()
+        scores = similarities.max(axis=1).toarray().ravel()
+        return self.labels[self.codes[best]], scores
+
+    def __len__(self):
+        """Number of nearest-neighbour exemplars."""
+        return len(self.codes)
@@ -0,0 +1,81 @@
+"""Loaded-once store of predefined responses, pre-serialized to JSON bytes.
+
+Answer text lives in responses.json (category id -> text). The store is
+polled for changes every RESPONSES_RELOAD_INTERVAL seconds, so answers can
+be edited without retraining or restarting workers.
+"""
+import json
+import logging
+import os
+
+from background import FilePoller
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESPONSES_PATH = os.environ.get('RESPONSES_PATH', os.path.join(BASE_DIR, 'responses.json'))
+RESPONSES_RELOAD_INTERVAL = float(os.environ.get('RESPONSES_RELOAD_INTERVAL', 2.0))
+
+UNKNOWN_RESPONSE = "Sorry, I don't understand your question."
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(obj):
+    # Same encoding Flask's jsonify uses outside debug mode
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode()
+
+
+def _serialize(text, source):
+    if source is None:
+        return dumps({'response': text})
+    return dumps({'response': text, 'source': source})
+
+
+class ResponseStore:
+    def __init__(self, path=RESPONSES_PATH, reload_interval=RESPONSES_RELOAD_INTERVAL, sources=(None,)):
+        self.path = path
+        self.reload_interval = reload_interval
+        # One body per (category, source); a None source adds no "source" field
+        self.sources = sources
+        self._unknown_bodies = {source: _serialize(UNKNOWN_RESPONSE, source) for source in sources}
+        self._bodies = {}
+        self._poller = FilePoller(path, reload_interval, self._reload)
+        self.load()
+
+    def load(self):
+        """Read the file and swap in freshly serialized bodies; ValueError if it is malformed."""
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, encoding='utf-8') as f:
+            texts = json.load(f)
+        if not isinstance(texts, dict) or not all(isinstance(text, str) for text in texts.values()):
+            raise ValueError("%s must be a JSON object of category -> response text" % self.path)
+        bodies = {(str(category), source): _serialize(text, source)
+                  for category, text in texts.items() for source in self.sources}
+        # A single assignment, so readers see either the old or the new dict
+        self._bodies = bodies
+        self._poller.mtime = mtime
+
+    def maybe_reload(self):
+        """Reload if the file changed; checks the mtime at most once per interval."""
+        return self._poller.poll()
+
+    def _reload(self, mtime):
+        try:
+            self.load()
+        except (OSError, ValueError):
+            logger.exception("Could not reload %s; keeping previous responses", self.path)
+            return False
+        logger.info("Reloaded responses from %s", self.path)
+        return True
+
+    def body(self, category, source=None):
+        """Serialized {"response": ..., "source": ...} for a category, or the fallback answer."""
+        body = self._bodies.get((category, source))
+        if body is None:
+            return self._unknown_bodies[source]
+        return body
+
+    def __contains__(self, category):
+        return (category, self.sources[0]) in self._bodies
+
+    def __len__(self):
+        return len(self._bodies) // len(self.sources)
@@ -0,0 +1,34 @@
+"""Production server: runs wsgi:app under gunicorn.
+
+    python serve.py [--workers N] [--threads N] [--bind HOST:PORT]
+
+Use ``python app.py`` only for the single-process debug server.
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, help='threads per worker (default: 4)')
+    parser.add_argument('--bind', help='address to listen on (default: 0.0.0.0:8000)')
+    args = parser.parse_args()
+
+    argv = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BASE_DIR, 'gunicorn.conf.py'),
+            '--chdir', BASE_DIR]
+    if args.workers:
+        argv += ['--workers', str(args.workers)]
+    if args.threads:
+        argv += ['--threads', str(args.threads)]
+    if args.bind:
+        argv += ['--bind', args.bind]
+    argv.append('wsgi:app')
+    os.execv(sys.executable, argv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import pytest
+import spacy
+
+from preprocessing import SPACY_MODEL, compare_pipelines
+
+pytestmark = pytest.mark.skipif(not spacy.util.is_package(SPACY_MODEL), reason="%s is not installed" % SPACY_MODEL)
+
+
+def test_lean_pipeline_matches_full_on_training_corpus():
+    from model_store import load_dataset
+
+    texts = list(load_dataset()['question'])
+    diffs = compare_pipelines(texts)
+    assert diffs == [], '%d of %d rows differ, first: %r' % (len(diffs), len(texts), diffs[:5])